@@ -0,0 +1,120 @@
+import os
+import json
+import time
+import hashlib
+from pathlib import Path
+import numpy as np
+
+INDEX_FILE = 'index.json'
+
+def generate_with_codes(interface, **generate_kwargs) -> tuple:
+    """
+    Generate speech and also return the discrete audio codes the language model produced.
+
+    The codes are captured from the prompt processor, which is OuteTTS internal. If an interface does not
+    go through it, the codes come back as None.
+
+    :param interface: Initialized OuteTTS interface
+    :param generate_kwargs: Keyword arguments passed on to interface.generate
+    :return: Tuple of the ModelOutput and the list of audio codes (None if no audio was generated)
+    """
+    prompt_processor = interface.prompt_processor
+    extract_audio_from_tokens = prompt_processor.extract_audio_from_tokens
+    captured = {}
+
+    def capture(tokens):
+        codes = extract_audio_from_tokens(tokens)
+        captured['codes'] = codes
+        return codes
+
+    # Shadow the method on this instance only for the duration of the call
+    own_attribute = 'extract_audio_from_tokens' in vars(prompt_processor)
+    prompt_processor.extract_audio_from_tokens = capture
+    try:
+        output = interface.generate(**generate_kwargs)
+    finally:
+        if own_attribute:
+            prompt_processor.extract_audio_from_tokens = extract_audio_from_tokens
+        else:
+            del prompt_processor.extract_audio_from_tokens
+
+    return output, captured.get('codes') or None
+
+def render_params_key(params: dict) -> str:
+    """
+    Build a short stable key from the parameters that produced a set of codes.
+
+    :param params: Dictionary of render parameters
+    :return: Hex digest identifying the parameters
+    """
+    payload = json.dumps(params, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:10]
+
+def load_index(codes_dir: str) -> dict:
+    """
+    Load the index of a codes directory.
+
+    :param codes_dir: Path to the codes directory
+    :return: Dictionary mapping entry keys to their metadata (empty if there is no index yet)
+    """
+    index_path = Path(codes_dir) / INDEX_FILE
+    if not index_path.exists():
+        return {}
+    with open(index_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def save_codes(codes_dir: str, output_name: str, codes: list, params: dict) -> Path:
+    """
+    Save the audio codes of one output as a .npy file and record it in the index.
+
+    :param codes_dir: Path to the codes directory
+    :param output_name: OutputName of the row the codes belong to
+    :param codes: List of audio codes
+    :param params: Dictionary of render parameters that produced the codes
+    :return: Path to the saved .npy file
+    """
+    codes_path = Path(codes_dir)
+    codes_path.mkdir(parents=True, exist_ok=True)
+
+    key = f"{output_name}_{render_params_key(params)}"
+    file_name = f"{key}.npy"
+    # WavTokenizer codebooks have fewer than 65536 entries, so uint16 is lossless
+    np.save(codes_path / file_name, np.asarray(codes, dtype=np.uint16))
+
+    index = load_index(codes_dir)
+    index[key] = {
+        'OutputName': output_name,
+        'file': file_name,
+        'num_codes': len(codes),
+        'created': time.time(),
+        'params': params,
+    }
+
+    # Write to a temporary file first so an interrupted run never leaves a broken index
+    index_path = codes_path / INDEX_FILE
+    tmp_path = codes_path / f"{INDEX_FILE}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(index, f, indent=4, ensure_ascii=False)
+    os.replace(tmp_path, index_path)
+
+    return codes_path / file_name
+
+def select_entries(index: dict, keys: list = None, params: dict = None) -> dict:
+    """
+    Pick one entry per OutputName, the most recently generated among those matching the filters.
+
+    :param index: Dictionary mapping entry keys to their metadata
+    :param keys: Entry keys to choose from, all entries if empty
+    :param params: Render parameters the entries must have, compared as strings
+    :return: Dictionary mapping OutputName to its selected entry, with its key added under 'key'
+    """
+    selected = {}
+    for key, entry in index.items():
+        if keys and key not in keys:
+            continue
+        if params and any(str(entry['params'].get(name)) != value for name, value in params.items()):
+            continue
+        current = selected.get(entry['OutputName'])
+        if current is None or entry['created'] > current['created']:
+            selected[entry['OutputName']] = dict(entry, key=key)
+    return selected
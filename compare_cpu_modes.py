@@ -0,0 +1,189 @@
+import gc
+import sys
+import json
+import time
+from pathlib import Path
+import argparse
+import pandas as pd
+import torch
+import soundfile as sf
+from infer_csv import load_interface, load_speakers, set_cpu_threads
+
+def word_error_rate(reference: str, hypothesis: str) -> float:
+    """
+    Compute the word error rate between a reference and a hypothesis transcription.
+
+    :param reference: Reference text
+    :param hypothesis: Transcribed text
+    :return: Word error rate (edit distance divided by the number of reference words)
+    """
+    def normalize(text: str) -> list:
+        return ''.join(c for c in text.lower() if c.isalnum() or c.isspace()).split()
+
+    ref, hyp = normalize(reference), normalize(hypothesis)
+    if not ref:
+        return 0.0 if not hyp else 1.0
+
+    # Levenshtein distance over words
+    previous = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, start=1):
+        current = [i]
+        for j, hyp_word in enumerate(hyp, start=1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (ref_word != hyp_word),
+            ))
+        previous = current
+    return previous[-1] / len(ref)
+
+def run_mode(config: dict, mode: str, df: pd.DataFrame, outputs_dir: Path, seed: int) -> list:
+    """
+    Synthesize every row of the CSV with one inference mode and time each row.
+
+    :param config: Dictionary containing the configuration parameters
+    :param mode: Name of the mode, either 'fp32' or 'cpu_int8'
+    :param df: DataFrame with the OutputName, SpeakerID and Text columns
+    :param outputs_dir: Directory to write this mode's audio files to
+    :param seed: Random seed applied before each row so both modes sample alike
+    :return: List of per-row result dictionaries
+    """
+    # Threads are set once in main, inter-op threads cannot be changed afterwards
+    mode_config = dict(config, device='cpu', num_threads=0, num_interop_threads=0)
+    if mode == 'fp32':
+        mode_config['inference_mode'] = 'default'
+        mode_config['dtype'] = 'float32'
+    else:
+        mode_config['inference_mode'] = 'cpu_int8'
+
+    load_start = time.perf_counter()
+    interface = load_interface(mode_config)
+    load_time = time.perf_counter() - load_start
+    print(f"[{mode}] Model loaded in {load_time:.1f}s".encode('utf-8').decode())
+
+    speakers = load_speakers(config['speakers_dir'])
+    outputs_dir.mkdir(parents=True, exist_ok=True)
+
+    results = []
+    for index, row in df.iterrows():
+        speaker_name = row['SpeakerID']
+        text = row['Text'].strip().strip('"').strip("'") + " "
+        output_name = row['OutputName']
+
+        if speaker_name not in speakers:
+            print(f"Speaker {speaker_name} not found in the speakers directory.".encode('utf-8').decode())
+            continue
+
+        speaker = interface.load_speaker(speakers[speaker_name])
+
+        torch.manual_seed(seed)
+        start = time.perf_counter()
+        output = interface.generate(
+            text=text,
+            temperature=config['temperature'],
+            repetition_penalty=config['repetition_penalty'],
+            max_length=config['max_length'],
+            speaker=speaker,
+        )
+        elapsed = time.perf_counter() - start
+
+        output_path = outputs_dir / f"{output_name}.wav"
+        output.save(str(output_path))
+        audio_seconds = sf.info(str(output_path)).duration
+
+        results.append({
+            'mode': mode,
+            'OutputName': output_name,
+            'Text': text.strip(),
+            'generate_seconds': elapsed,
+            'audio_seconds': audio_seconds,
+            'real_time_factor': elapsed / audio_seconds if audio_seconds else float('nan'),
+            'load_seconds': load_time,
+            'path': str(output_path),
+        })
+        print(f"[{mode}] {output_name}: {elapsed:.2f}s for {audio_seconds:.2f}s of audio".encode('utf-8').decode())
+
+    del interface
+    gc.collect()
+    return results
+
+def add_transcription_scores(results: list, whisper_model: str, language: str) -> bool:
+    """
+    Transcribe each output with Whisper and add the word error rate against the input text.
+
+    :param results: List of per-row result dictionaries, updated in place
+    :param whisper_model: Name of the Whisper model to use
+    :param language: Language code of the synthesized speech
+    :return: True if scores were added, False if Whisper is not installed
+    """
+    try:
+        import whisper
+    except ImportError:
+        print("openai-whisper is not installed, skipping word error rate.".encode('utf-8').decode())
+        return False
+
+    model = whisper.load_model(whisper_model, device='cpu')
+    for result in results:
+        transcription = model.transcribe(result['path'], language=language, fp16=False)['text']
+        result['transcription'] = transcription.strip()
+        result['wer'] = word_error_rate(result['Text'], transcription)
+    return True
+
+def main(config: dict, csv_file: str, outputs_dir: str, seed: int, whisper_model: str) -> None:
+    """
+    Compare fp32 and dynamic int8 CPU inference on the same CSV for speed and quality.
+
+    :param config: Dictionary containing the configuration parameters
+    :param csv_file: Path to the CSV file containing the input data
+    :param outputs_dir: Directory for the comparison audio and report
+    :param seed: Random seed applied before each row
+    :param whisper_model: Name of the Whisper model used to score intelligibility
+    """
+    set_cpu_threads(config.get('num_threads', 0), config.get('num_interop_threads', 0))
+
+    df = pd.read_csv(csv_file)
+    outputs_path = Path(outputs_dir)
+
+    # Run the modes one after the other so only one model is in memory at a time
+    results = []
+    for mode in ('fp32', 'cpu_int8'):
+        results.extend(run_mode(config, mode, df, outputs_path / mode, seed))
+
+    has_wer = add_transcription_scores(results, whisper_model, config['language'])
+
+    report = pd.DataFrame(results)
+    report_path = outputs_path / 'comparison.csv'
+    report.to_csv(report_path, index=False)
+
+    columns = ['generate_seconds', 'audio_seconds', 'real_time_factor', 'load_seconds']
+    if has_wer:
+        columns.append('wer')
+    summary = report.groupby('mode')[columns].mean()
+    totals = report.groupby('mode')['generate_seconds'].sum()
+
+    print("\nMean per row:")
+    print(summary.to_string())
+    if 'fp32' in totals and 'cpu_int8' in totals and totals['cpu_int8'] > 0:
+        print(f"\nTotal generation time: fp32 {totals['fp32']:.1f}s, int8 {totals['cpu_int8']:.1f}s "
+              f"({totals['fp32'] / totals['cpu_int8']:.2f}x speedup)".encode('utf-8').decode())
+    print(f"\nPer-row results saved to {report_path}".encode('utf-8').decode())
+
+if __name__ == '__main__':
+    # Set up argument parser
+    parser = argparse.ArgumentParser(description='Compare fp32 and dynamic int8 CPU inference of OuteTTS.')
+    parser.add_argument('--csv_file', type=str, default='outtsinput.csv', help='Path to the CSV file containing the input data')
+    parser.add_argument('--outputs_dir', type=str, default='outputs_comparison', help='Directory for the comparison audio and report')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed applied before each row')
+    parser.add_argument('--whisper_model', type=str, default='base', help='Whisper model used to compute the word error rate')
+    args = parser.parse_args()
+
+    # Load configuration from outtsconfig.json
+    config_path = Path('outtsconfig.json')
+    if not config_path.exists():
+        print(f"Configuration file {config_path} does not exist.".encode('utf-8').decode())
+        sys.exit(1)
+
+    with open(config_path, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+
+    main(config, args.csv_file, args.outputs_dir, args.seed, args.whisper_model)
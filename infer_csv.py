@@ -1,19 +1,23 @@
 import outetts
 import torch
+import transformers
 import sys
 import os
 import json
+import hashlib
 from pathlib import Path
 import argparse
 import pandas as pd
+from audio_codes import generate_with_codes, save_codes
 
-def configure_model(model_path: str, language: str, dtype: torch.dtype) -> outetts.HFModelConfig_v1:
+def configure_model(model_path: str, language: str, dtype: torch.dtype, device: str = None) -> outetts.HFModelConfig_v1:
     """
     Configure the GGUF model.
 
     :param model_path: Path to the model file
     :param language: Language code for the model
     :param dtype: Data type for the model
+    :param device: Device to load the model on (None lets OuteTTS pick one)
     :return: Configured HFModelConfig_v1 object
     """
     try:
@@ -21,6 +25,7 @@ def configure_model(model_path: str, language: str, dtype: torch.dtype) -> outet
             model_path=model_path,
             language=language,
             dtype=dtype,
+            device=device,
         )
         print(f"Model configured successfully with path: {model_path}".encode('utf-8').decode())
         return model_config
@@ -44,6 +49,206 @@ def initialize_interface(model_version: str, model_config: outetts.GGUFModelConf
         print(f"Error initializing interface: {e}".encode('utf-8').decode())
         sys.exit(1)
 
+def set_cpu_threads(num_threads: int, num_interop_threads: int) -> None:
+    """
+    Set the torch intra-op and inter-op thread counts. A value of 0 keeps the torch default.
+
+    :param num_threads: Number of intra-op threads
+    :param num_interop_threads: Number of inter-op threads
+    """
+    if num_threads > 0:
+        torch.set_num_threads(num_threads)
+    if num_interop_threads > 0:
+        # Must run before any inter-op parallel work has started
+        torch.set_num_interop_threads(num_interop_threads)
+    print(f"Using {torch.get_num_threads()} intra-op and {torch.get_num_interop_threads()} inter-op threads.".encode('utf-8').decode())
+
+def checkpoint_fingerprint(model_path: str) -> str:
+    """
+    Build a short fingerprint of a checkpoint and the library versions that load it.
+
+    :param model_path: Path or hub id of the model (hub models must already be downloaded)
+    :return: Hex digest that changes when the checkpoint, torch or transformers changes
+    """
+    model_dir = Path(model_path)
+    if not model_dir.is_dir():
+        from huggingface_hub import snapshot_download
+        model_dir = Path(snapshot_download(model_path, local_files_only=True))
+
+    digest = hashlib.sha1(f"torch-{torch.__version__}:transformers-{transformers.__version__}".encode('utf-8'))
+    config_file = model_dir / 'config.json'
+    if config_file.exists():
+        digest.update(config_file.read_bytes())
+    for weights_file in sorted(model_dir.glob('*.safetensors')) + sorted(model_dir.glob('*.bin')):
+        stat = weights_file.stat()
+        digest.update(f"{weights_file.name}:{stat.st_size}:{stat.st_mtime_ns}".encode('utf-8'))
+    return digest.hexdigest()[:12]
+
+def quantized_cache_path(cache_dir: str, model_path: str) -> Path:
+    """
+    Build the path of the cached int8 weights for a given model.
+
+    :param cache_dir: Directory holding cached quantized weights
+    :param model_path: Path or hub id of the original model
+    :return: Path to the cached quantized state dict
+    """
+    model_name = model_path.replace('/', '_').replace('\\', '_').replace(':', '_')
+    return Path(cache_dir) / f"{model_name}.int8.{checkpoint_fingerprint(model_path)}.pt"
+
+def quantize_model(model: torch.nn.Module) -> torch.nn.Module:
+    """
+    Apply dynamic int8 quantization to the linear layers of a model, in place.
+
+    :param model: fp32 model on the CPU
+    :return: The quantized model
+    """
+    # Quantize in place so the fp32 model is not copied
+    torch.ao.quantization.quantize_dynamic(
+        model,
+        {torch.nn.Linear},
+        dtype=torch.qint8,
+        inplace=True,
+    )
+    print("Model quantized to dynamic int8.".encode('utf-8').decode())
+    return model
+
+def save_quantized_cache(model: torch.nn.Module, cache_path: Path) -> None:
+    """
+    Save the weights of a quantized model so later runs can skip loading and quantizing the fp32 model.
+
+    :param model: Dynamically quantized model
+    :param cache_path: Path to write the cache file to
+    """
+    state_dict = model.state_dict()
+    # Non-persistent buffers (e.g. rotary embedding frequencies) are not in the state dict
+    buffers = {name: buffer for name, buffer in model.named_buffers() if name not in state_dict}
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    torch.save({'state_dict': state_dict, 'buffers': buffers}, cache_path)
+    print(f"Quantized weights cached to {cache_path}".encode('utf-8').decode())
+
+def load_quantized_cache(model_path: str, cache_path: Path) -> torch.nn.Module:
+    """
+    Build a dynamically quantized model from cached weights, without loading or quantizing the fp32 weights.
+
+    :param model_path: Path or hub id of the model, used for its configuration
+    :param cache_path: Path to the cache file written by save_quantized_cache
+    :return: Quantized model on the CPU
+    """
+    cache = torch.load(cache_path, weights_only=True)
+
+    # Create the module structure on the meta device so no fp32 weights are allocated
+    model_config = transformers.AutoConfig.from_pretrained(model_path)
+    with torch.device('meta'):
+        model = transformers.AutoModelForCausalLM.from_config(model_config)
+
+    # Swap the linear layers for empty int8 ones, the cache fills in their weights
+    for name, module in list(model.named_modules()):
+        for child_name, child in list(module.named_children()):
+            if type(child) is torch.nn.Linear:
+                setattr(module, child_name, torch.ao.nn.quantized.dynamic.Linear(
+                    child.in_features, child.out_features, bias_=child.bias is not None, dtype=torch.qint8,
+                ))
+
+    model.load_state_dict(cache['state_dict'], strict=True, assign=True)
+    for name, buffer in cache['buffers'].items():
+        module_name, _, buffer_name = name.rpartition('.')
+        model.get_submodule(module_name).register_buffer(buffer_name, buffer, persistent=False)
+
+    remaining = [name for name, tensor in list(model.named_parameters()) + list(model.named_buffers()) if tensor.is_meta]
+    if remaining:
+        raise ValueError(f"Cache does not cover {', '.join(remaining)}")
+
+    try:
+        model.generation_config = transformers.GenerationConfig.from_pretrained(model_path)
+    except OSError:
+        pass  # The checkpoint has no generation_config.json, keep the defaults
+    return model.eval()
+
+def initialize_interface_with_model(model_version: str, model_config: outetts.HFModelConfig_v1, model: torch.nn.Module) -> outetts.InterfaceHF:
+    """
+    Initialize the HF interface around an already built model instead of loading the checkpoint.
+
+    :param model_version: Version of the model
+    :param model_config: Configured HFModelConfig_v1 object
+    :param model: Model to use for generation
+    :return: Initialized InterfaceHF object
+    """
+    from outetts.version.v1 import interface as interface_v1
+    hf_model_class = interface_v1.HFModel
+
+    def use_model(model_path, device=None, dtype=None, additional_model_config={}):
+        hf_model = hf_model_class.__new__(hf_model_class)
+        hf_model.device = torch.device(device)
+        hf_model.dtype = dtype
+        hf_model.model = model
+        return hf_model
+
+    # The interface loads its model through HFModel, so swap it out while the interface is created
+    interface_v1.HFModel = use_model
+    try:
+        return initialize_interface(model_version, model_config)
+    finally:
+        interface_v1.HFModel = hf_model_class
+
+def load_cpu_int8_interface(config: dict) -> outetts.InterfaceHF:
+    """
+    Initialize the interface with a dynamically quantized int8 model on the CPU, using the cache if possible.
+
+    :param config: Dictionary containing the configuration parameters
+    :return: Initialized InterfaceHF object
+    """
+    model_path = config['model_path']
+    # Dynamic quantization works on fp32 weights and only runs on the CPU
+    model_config = configure_model(model_path, config['language'], torch.float32, device='cpu')
+
+    cache_path = None
+    cache_dir = config.get('quantized_cache_dir')
+    if cache_dir:
+        try:
+            cache_path = quantized_cache_path(cache_dir, model_path)
+        except Exception as e:
+            print(f"Error fingerprinting {model_path}, quantized weights will not be cached: {e}".encode('utf-8').decode())
+
+    if cache_path is not None and cache_path.exists():
+        try:
+            model = load_quantized_cache(model_path, cache_path)
+            print(f"Loaded quantized weights from {cache_path}".encode('utf-8').decode())
+            return initialize_interface_with_model(config['model_version'], model_config, model)
+        except Exception as e:
+            # The half-built model is discarded, the cache is rebuilt from the checkpoint below
+            print(f"Error loading quantized weights from {cache_path}, re-quantizing: {e}".encode('utf-8').decode())
+
+    interface = initialize_interface(config['model_version'], model_config)
+    quantize_model(interface.model.model)
+    if cache_path is not None:
+        save_quantized_cache(interface.model.model, cache_path)
+    return interface
+
+def load_interface(config: dict) -> outetts.InterfaceHF:
+    """
+    Configure the model and initialize the interface according to the inference mode in the config.
+
+    :param config: Dictionary containing the configuration parameters
+    :return: Initialized InterfaceHF object
+    """
+    dtype_map = {
+        'bfloat16': torch.bfloat16,
+        'float16': torch.float16,
+        'float32': torch.float32,
+    }
+    inference_mode = config.get('inference_mode', 'default')
+
+    if inference_mode == 'cpu_int8':
+        set_cpu_threads(config.get('num_threads', 0), config.get('num_interop_threads', 0))
+        return load_cpu_int8_interface(config)
+
+    if inference_mode != 'default':
+        print(f"Unknown inference_mode {inference_mode}, using default.".encode('utf-8').decode())
+
+    dtype = dtype_map.get(config['dtype'], torch.bfloat16)
+    model_config = configure_model(config['model_path'], config['language'], dtype, config.get('device'))
+    return initialize_interface(config['model_version'], model_config)
+
 def load_speakers(speakers_dir: str) -> dict:
     """
     Load speaker JSON files from the speakers directory.
@@ -65,18 +270,8 @@ def main(config: dict, csv_file: str) -> None:
     :param config: Dictionary containing the configuration parameters
     :param csv_file: Path to the CSV file containing the input data
     """
-    # Configure the model
-    dtype_map = {
-        'bfloat16': torch.bfloat16,
-        'float16': torch.float16,
-        'float32': torch.float32,
-    }
-    dtype = dtype_map.get(config['dtype'], torch.bfloat16)
-
-    model_config = configure_model(config['model_path'], config['language'], dtype)
-
-    # Initialize the GGUF interface
-    interface = initialize_interface(config['model_version'], model_config)
+    # Configure the model and initialize the interface
+    interface = load_interface(config)
 
     # Load speakers from the speakers directory
     speakers_dir = config['speakers_dir']  # Path to the speakers directory from config
@@ -89,6 +284,11 @@ def main(config: dict, csv_file: str) -> None:
     outputs_dir = config['outputs_dir']  # Path to the outputs directory from config
     os.makedirs(outputs_dir, exist_ok=True)
 
+    # Optionally keep the generated audio codes next to the outputs
+    save_codes_enabled = config.get('save_codes', False)
+    codes_dir = config.get('codes_dir') or os.path.join(outputs_dir, 'codes')
+    inference_mode = config.get('inference_mode', 'default')
+
     for index, row in df.iterrows():
         speaker_name = row['SpeakerID']
         text = row['Text']
@@ -105,19 +305,45 @@ def main(config: dict, csv_file: str) -> None:
         speaker = interface.load_speaker(speaker_path)
 
         # Generate speech
-        output = interface.generate(
+        generate_kwargs = dict(
             text=text,
             temperature=config['temperature'],
             repetition_penalty=config['repetition_penalty'],
             max_length=config['max_length'],
             speaker=speaker,
         )
+        if save_codes_enabled:
+            output, codes = generate_with_codes(interface, **generate_kwargs)
+        else:
+            output = interface.generate(**generate_kwargs)
 
         # Save the synthesized speech to a file in the outputs directory
         output_path = Path(outputs_dir) / f"{output_name}.wav"
         output.save(str(output_path))
         print(f"Synthesized speech saved to {output_path}".encode('utf-8').decode())
 
+        # Save the generated audio codes so the row can be re-rendered without the language model
+        if save_codes_enabled and codes is None:
+            print(f"Warning: no audio codes captured for {output_name}, nothing saved to {codes_dir}".encode('utf-8').decode())
+        elif save_codes_enabled:
+            params = {
+                'SpeakerID': speaker_name,
+                'Text': text,
+                'model_path': config['model_path'],
+                'model_version': config['model_version'],
+                'language': config['language'],
+                'inference_mode': inference_mode,
+                # cpu_int8 always loads float32 weights, whatever dtype is set to
+                'dtype': 'float32' if inference_mode == 'cpu_int8' else config['dtype'],
+                'temperature': config['temperature'],
+                'repetition_penalty': config['repetition_penalty'],
+                'max_length': config['max_length'],
+            }
+            if config.get('device'):
+                params['device'] = config['device']
+            codes_path = save_codes(codes_dir, output_name, codes, params)
+            print(f"Audio codes saved to {codes_path}".encode('utf-8').decode())
+
 if __name__ == '__main__':
     # Set up argument parser
     parser = argparse.ArgumentParser(description='Generate speech using OuteTTS.')
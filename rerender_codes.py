@@ -0,0 +1,175 @@
+import os
+import sys
+import json
+from pathlib import Path
+import argparse
+import numpy as np
+import torch
+import torchaudio
+from outetts.wav_tokenizer.audio_codec import AudioCodec
+from audio_codes import load_index, select_entries
+
+def decode_batch(audio_codec: AudioCodec, batch: list, pad: bool = False) -> list:
+    """
+    Decode a batch of code arrays to waveforms in a single decoder call.
+
+    The decoder attends over the whole time axis, so padding changes every sample of the shorter
+    rows slightly. Without pad, all arrays must have the same number of codes and the result matches
+    decoding each one on its own. With pad, shorter arrays are padded to the longest one and each
+    waveform is trimmed back to its own length afterwards.
+
+    :param audio_codec: Initialized WavTokenizer audio codec
+    :param batch: List of 1-D numpy arrays of audio codes
+    :param pad: Allow arrays of different lengths by padding them
+    :return: List of waveform tensors of shape (1, samples), one per code array
+    """
+    max_len = max(len(codes) for codes in batch)
+    if not pad and any(len(codes) != max_len for codes in batch):
+        raise ValueError("All code arrays in a batch must have the same length unless padding is enabled.")
+
+    padded = np.stack([np.pad(codes, (0, max_len - len(codes)), mode='edge') for codes in batch])
+    # Same (1, batch, time) layout infer_csv.py decodes with, just with a larger batch
+    codes_tensor = torch.from_numpy(padded.astype(np.int64)).unsqueeze(0).to(audio_codec.device)
+    audio = audio_codec.decode(codes_tensor).cpu()
+
+    hop_length = audio.shape[-1] // max_len
+    return [audio[i:i + 1, :len(codes) * hop_length] for i, codes in enumerate(batch)]
+
+def make_batches(entries: list, batch_size: int, pad: bool = False) -> list:
+    """
+    Group index entries into batches of at most batch_size entries.
+
+    Without pad only entries with the same number of codes share a batch. With pad, entries are sorted
+    by length and split into consecutive batches, so each batch needs as little padding as possible.
+
+    :param entries: List of index entries
+    :param batch_size: Maximum number of entries per batch
+    :param pad: Allow entries of different lengths in a batch
+    :return: List of lists of index entries
+    """
+    if pad:
+        groups = [sorted(entries, key=lambda entry: entry['num_codes'])]
+    else:
+        by_length = {}
+        for entry in entries:
+            by_length.setdefault(entry['num_codes'], []).append(entry)
+        groups = [by_length[num_codes] for num_codes in sorted(by_length)]
+
+    batches = []
+    for group in groups:
+        batches.extend(group[i:i + batch_size] for i in range(0, len(group), batch_size))
+    return batches
+
+def parse_params(param_args: list) -> dict:
+    """
+    Parse NAME=VALUE render parameter filters.
+
+    :param param_args: List of NAME=VALUE strings
+    :return: Dictionary mapping parameter names to values
+    """
+    params = {}
+    for param in param_args:
+        if '=' not in param:
+            print(f"Invalid parameter filter {param}, expected NAME=VALUE".encode('utf-8').decode())
+            sys.exit(1)
+        name, value = param.split('=', 1)
+        params[name] = value
+    return params
+
+def list_entries(index: dict) -> None:
+    """
+    Print every entry of the index with its key and render parameters.
+
+    :param index: Dictionary mapping entry keys to their metadata
+    """
+    for key, entry in sorted(index.items(), key=lambda item: (item[1]['OutputName'], item[1]['created'])):
+        params = ', '.join(f"{name}={value}" for name, value in entry['params'].items() if name != 'Text')
+        print(f"{key}: {entry['num_codes']} codes, {params}".encode('utf-8').decode())
+
+def main(codes_dir: str, outputs_dir: str, extension: str, sample_rate: int, batch_size: int, pad: bool, device: str,
+         output_names: list, keys: list, params: dict) -> None:
+    """
+    Decode stored audio codes to audio files without loading the language model.
+
+    :param codes_dir: Path to the codes directory written by infer_csv.py
+    :param outputs_dir: Directory to write the audio files to
+    :param extension: Output file extension (e.g., wav, flac)
+    :param sample_rate: Output sample rate, 0 keeps the decoder sample rate
+    :param batch_size: Maximum number of outputs decoded per decoder call
+    :param pad: Pad outputs of different lengths into shared batches, which changes the audio slightly
+    :param device: Device to run the decoder on
+    :param output_names: OutputNames to render, empty renders all of them
+    :param keys: Index entry keys to choose from, empty allows all entries
+    :param params: Render parameters the chosen entries must have
+    """
+    index = load_index(codes_dir)
+    if not index:
+        print(f"No audio codes found in {codes_dir}".encode('utf-8').decode())
+        sys.exit(1)
+
+    # Render the latest matching codes for each OutputName
+    entries = select_entries(index, keys, params)
+    if output_names:
+        for name in output_names:
+            if name not in entries:
+                print(f"No matching audio codes found for {name}".encode('utf-8').decode())
+        entries = {name: entries[name] for name in output_names if name in entries}
+
+    if not entries:
+        print("No audio codes match the selection.".encode('utf-8').decode())
+        sys.exit(1)
+
+    audio_codec = AudioCodec(device=device)
+    decoder_sr = audio_codec.sr
+    target_sr = sample_rate or decoder_sr
+    print(f"Decoding {len(entries)} outputs at {target_sr} Hz on {device}".encode('utf-8').decode())
+
+    outputs_path = Path(outputs_dir)
+    outputs_path.mkdir(parents=True, exist_ok=True)
+
+    for batch_entries in make_batches(list(entries.values()), batch_size, pad):
+        batch = [np.load(Path(codes_dir) / entry['file']) for entry in batch_entries]
+
+        for entry, audio in zip(batch_entries, decode_batch(audio_codec, batch, pad)):
+            if target_sr != decoder_sr:
+                audio = torchaudio.functional.resample(audio, decoder_sr, target_sr)
+
+            output_path = outputs_path / f"{entry['OutputName']}.{extension}"
+            if extension.lower() == 'wav':
+                # Same encoding as the WAVs written by infer_csv.py
+                torchaudio.save(str(output_path), audio, sample_rate=target_sr, encoding='PCM_S', bits_per_sample=16)
+            else:
+                torchaudio.save(str(output_path), audio, sample_rate=target_sr)
+            print(f"Rendered {entry['key']} to {output_path}".encode('utf-8').decode())
+
+if __name__ == '__main__':
+    # Load configuration from outtsconfig.json for the default directories
+    config = {}
+    config_path = Path('outtsconfig.json')
+    if config_path.exists():
+        with open(config_path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+    outputs_dir = config.get('outputs_dir', 'outputs')
+    codes_dir = config.get('codes_dir') or os.path.join(outputs_dir, 'codes')
+
+    # Set up argument parser
+    parser = argparse.ArgumentParser(description='Re-render stored OuteTTS audio codes to audio without the language model.')
+    parser.add_argument('-c', '--codes_dir', type=str, default=codes_dir, help='Directory containing the stored audio codes')
+    parser.add_argument('-o', '--outputs_dir', type=str, default=os.path.join(outputs_dir, 'rerendered'), help='Directory to write the audio files to')
+    parser.add_argument('-e', '--extension', type=str, default='wav', help='Output file extension (e.g., wav, flac)')
+    parser.add_argument('-r', '--sample_rate', type=int, default=0, help='Output sample rate, 0 keeps the decoder sample rate')
+    parser.add_argument('-b', '--batch_size', type=int, default=1, help='Maximum number of outputs decoded per decoder call')
+    parser.add_argument('-P', '--pad', action='store_true', help='Pad outputs of different lengths into shared batches, faster but not identical to a single-output decode')
+    parser.add_argument('-d', '--device', type=str, default='cuda' if torch.cuda.is_available() else 'cpu', help='Device to run the decoder on')
+    parser.add_argument('-k', '--key', action='append', default=[], help='Index entry key to render, may be given several times')
+    parser.add_argument('-p', '--param', action='append', default=[], help='Only render entries with this render parameter, as NAME=VALUE, may be given several times')
+    parser.add_argument('-l', '--list', action='store_true', help='List the stored entries and their keys, then exit')
+    parser.add_argument('output_names', nargs='*', help='OutputNames to render, all of them if omitted')
+    args = parser.parse_args()
+
+    if args.list:
+        list_entries(load_index(args.codes_dir))
+        sys.exit(0)
+
+    main(args.codes_dir, args.outputs_dir, args.extension, args.sample_rate, args.batch_size, args.pad, args.device,
+         args.output_names, args.key, parse_params(args.param))